@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 import hashlib
+import hmac
+import io
 import streamlit as st
 
 
@@ -41,64 +44,28 @@ ADMIN_PASSWORD_HASH = hash_password(ADMIN_PASSWORD_PLAIN)
 # GLOBAL STYLES
 # =========================
 
-# Custom CSS for sidebar buttons
-st.markdown("""
-<style>
-/* Default sidebar button */ 
-
-.stButton > button {
-    width: 100%;
-    border-radius: 6px;
-    background-color: transparent;
-    color: 7D7A7A;
-    font-weight: 600;
-    gap: 0rem;
-    border: none;
-    margin: -50% 0 !important;
-    padding-right: 10px;
-    text-align: left;
-    
-}
-
-/* Hover animation */
-.stButton > button:hover {
-    background-color: #D4D4D4;
-    
-}
-
-/* ACTIVE TAB BUTTON */
-.active-tab > button {
-    background-color: #fff !important;
-    color: white !important;
-    border: 1px solid #049E52 !important;
-    transform: translateX(8px);
-}
-
-
-</style>
-""", unsafe_allow_html=True)
-
-st.markdown(
-    """
-    <style>
-    .big-metric {
-        font-size: 26px !important;
-        font-weight: 700 !important;
-    }
-    .semi-bold {
-        font-weight: 600 !important;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+ROLE_CARD_HTML = """
+<div style="
+    padding: 10px;
+    border-radius: 10px;
+    background: #f1f5f9;
+    text-align: center;
+    margin-bottom: 10px;
+    border-left: 5px solid #fa7f6b;
+    color:black;
+">
+    <h4 style="margin: 0;">{role}</h4>
+    <p style="font-size: 26px; font-weight: bold;">{count}</p>
+</div>
+"""
 
 # =========================
 # DB INITIALIZATION HELPERS
 # =========================
 
-def ensure_admin_user():
-    """Ensure the single admin user exists in Supabase."""
+@st.cache_resource
+def ensure_admin_user() -> bool:
+    """Ensure the single admin user exists in Supabase (runs once per server process)."""
     db = get_db()
     res = db.table("admin_auth").select("username").eq("username", ADMIN_USERNAME).execute()
     if not res.data:
@@ -106,37 +73,86 @@ def ensure_admin_user():
             "username": ADMIN_USERNAME,
             "password_hash": ADMIN_PASSWORD_HASH
         }).execute()
+    return True
 
 
 # =========================
 # SETTINGS HELPERS (Supabase)
 # =========================
 
-def get_setting(conn, key, default=None):
+@st.cache_data(ttl=300, show_spinner=False)
+def get_settings():
+    """All settings as {key: value}; the table only holds a few rows."""
     db = get_db()
-    res = db.table("settings").select("value").eq("key", key).execute()
-    if not res.data:
-        return default
-    value = res.data[0]["value"]
-    try:
-        return float(value)
-    except (ValueError, TypeError):
-        return value
+    res = db.table("settings").select("key, value").execute()
+    settings = {}
+    for row in res.data or []:
+        value = row["value"]
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            pass
+        settings[row["key"]] = value
+    return settings
+
+
+def get_setting(key, default=None):
+    return get_settings().get(key, default)
 
 
-def set_setting(conn, key, value):
+def set_settings(values):
+    """Upsert several settings in one request (PostgREST takes an array body)."""
     db = get_db()
-    db.table("settings").upsert({
-        "key": key,
-        "value": str(value)
-    }).execute()
+    db.table("settings").upsert([
+        {"key": key, "value": str(value)}
+        for key, value in values.items()
+    ]).execute()
+    get_settings.clear()
 
 
 # =========================
 # BUSINESS LOGIC: LOADERS
 # =========================
 
-def get_workers_df(conn, active_only=True):
+# Columns fetched by each loader (also used to build the DataFrames).
+WORKER_MIN_COLUMNS = ["id", "name", "daily_rate", "is_active"]
+TX_COLUMNS = ["id", "date", "type", "category", "amount", "description"]
+ATT_COLUMNS = ["id", "worker_id", "date", "status", "hours", "worker_name", "role", "daily_rate"]
+PAY_COLUMNS = ["id", "worker_id", "worker_name", "date", "type", "amount", "notes"]
+
+ATT_STATUSES = ["Present", "Absent", "Leave", "Half-Day"]
+
+# Supabase caps every response at 1000 rows by default.
+PAGE_SIZE = 1000
+
+# Rows shown in the Accounts "Payment History" table.
+PAYMENT_HISTORY_ROWS = 500
+
+
+def fetch_all_rows(build_query):
+    """
+    Run a select page by page and return all rows.
+    `build_query()` must return a fresh, fully ordered query built with
+    select(..., count="exact"); pages after the first are fetched in parallel.
+    The first page's length is used as the step, since the server's max-rows
+    setting may cap responses below PAGE_SIZE.
+    """
+    res = build_query().range(0, PAGE_SIZE - 1).execute()
+    rows = res.data or []
+    if res.count is None or not rows or len(rows) >= res.count:
+        return rows
+    step = len(rows)
+
+    def fetch_page(start):
+        return build_query().range(start, start + step - 1).execute().data or []
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        for page in ex.map(fetch_page, range(step, res.count, step)):
+            rows.extend(page)
+    return rows
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_workers_df(active_only=True):
     db = get_db()
     query = db.table("workers").select("*")
     if active_only:
@@ -147,23 +163,46 @@ def get_workers_df(conn, active_only=True):
     return pd.DataFrame(res.data)
 
 
-def get_transactions_df(conn, start_date=None, end_date=None):
-    """Load transactions as DataFrame with optional date filter."""
+@st.cache_data(ttl=60, show_spinner=False)
+def get_workers_minimal_df(active_only=True):
+    """Lightweight worker list (no personal / bank fields) for calculations."""
     db = get_db()
-    query = db.table("transactions").select("*")
-    if start_date:
-        query = query.gte("date", start_date.isoformat())
-    if end_date:
-        query = query.lte("date", end_date.isoformat())
-    res = query.order("date").execute()
+    query = db.table("workers").select(",".join(WORKER_MIN_COLUMNS))
+    if active_only:
+        query = query.eq("is_active", True)
+    res = query.order("name").execute()
     if not res.data:
         return pd.DataFrame()
-    df = pd.DataFrame(res.data)
-    df["date"] = pd.to_datetime(df["date"])
+    df = pd.DataFrame.from_records(res.data, columns=WORKER_MIN_COLUMNS)
+    df["daily_rate"] = pd.to_numeric(df["daily_rate"])
     return df
 
 
-def get_expense_totals(conn):
+@st.cache_data(ttl=60, show_spinner=False)
+def get_transactions_df(start_date=None, end_date=None):
+    """Load transactions as DataFrame with optional date filter."""
+    db = get_db()
+
+    def build_query():
+        query = db.table("transactions").select(",".join(TX_COLUMNS), count="exact")
+        if start_date:
+            query = query.gte("date", start_date.isoformat())
+        if end_date:
+            query = query.lte("date", end_date.isoformat())
+        return query.order("date").order("id")
+
+    rows = fetch_all_rows(build_query)
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_records(rows, columns=TX_COLUMNS)
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601", cache=True)
+    df["amount"] = pd.to_numeric(df["amount"])
+    df["type"] = df["type"].astype("category")
+    df["category"] = df["category"].astype("category")
+    return df
+
+
+def get_expense_totals():
     """
     Return dict with expense totals:
     - today_expense
@@ -172,19 +211,21 @@ def get_expense_totals(conn):
     """
     today = date.today()
 
-    tx_today = get_transactions_df(conn, start_date=today, end_date=today)
-    today_expense = float(tx_today[tx_today["type"] == "EXPENSE"]["amount"].sum()) if not tx_today.empty else 0.0
-
-    month_start = today.replace(day=1)
-    tx_month = get_transactions_df(conn, start_date=month_start, end_date=today)
-    month_expense = float(tx_month[tx_month["type"] == "EXPENSE"]["amount"].sum()) if not tx_month.empty else 0.0
-
     if today.month >= 4:
         fy_start = date(today.year, 4, 1)
     else:
         fy_start = date(today.year - 1, 4, 1)
-    tx_fy = get_transactions_df(conn, start_date=fy_start, end_date=today)
-    fy_expense = float(tx_fy[tx_fy["type"] == "EXPENSE"]["amount"].sum()) if not tx_fy.empty else 0.0
+
+    # Summed in Postgres: see supabase/migrations/*_dashboard_aggregates.sql
+    db = get_db()
+    res = db.rpc("expense_totals", {
+        "p_today": today.isoformat(),
+        "p_fy_start": fy_start.isoformat()
+    }).execute()
+    row = res.data[0] if res.data else {}
+    today_expense = float(row.get("today_expense") or 0.0)
+    month_expense = float(row.get("month_expense") or 0.0)
+    fy_expense = float(row.get("fy_expense") or 0.0)
 
     return {
         "today_expense": round(today_expense, 2),
@@ -194,86 +235,176 @@ def get_expense_totals(conn):
     }
 
 
-def get_attendance_df(conn, for_date=None):
+def _attendance_frame(rows):
+    """attendance_view rows -> DataFrame with the dtypes every attendance loader shares."""
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_records(rows, columns=ATT_COLUMNS)
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601", cache=True)
+    df["hours"] = pd.to_numeric(df["hours"])
+    df["daily_rate"] = pd.to_numeric(df["daily_rate"])
+    df["status"] = pd.Categorical(df["status"], categories=ATT_STATUSES)
+    df["role"] = df["role"].astype("category")
+    return df
+
+
+def _payments_frame(rows):
+    """worker_payments_view rows -> DataFrame with parsed dates and numeric amounts."""
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_records(rows, columns=PAY_COLUMNS)
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601", cache=True)
+    df["amount"] = pd.to_numeric(df["amount"])
+    return df
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_attendance_df(for_date=None):
     """
     Uses view attendance_view: a.id, worker_id, date, status, hours, worker_name, role, daily_rate
     """
     db = get_db()
-    query = db.table("attendance_view").select("*")
+    query = db.table("attendance_view").select(",".join(ATT_COLUMNS))
     if for_date:
         query = query.eq("date", for_date.isoformat())
     res = query.order("worker_name").execute()
-    if not res.data:
-        return pd.DataFrame()
-    df = pd.DataFrame(res.data)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+    return _attendance_frame(res.data)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_attendance_range_df(start_date, end_date):
+    db = get_db()
+
+    def build_query():
+        return (
+            db.table("attendance_view")
+            .select(",".join(ATT_COLUMNS), count="exact")
+            .gte("date", start_date.isoformat())
+            .lte("date", end_date.isoformat())
+            .order("date")
+            .order("id")
+        )
+
+    return _attendance_frame(fetch_all_rows(build_query))
 
 
-def get_attendance_range_df(conn, start_date, end_date):
+@st.cache_data(ttl=60, show_spinner=False)
+def get_worker_payments_df(page=0):
+    """
+    One page of payment history, newest first: (df, total_rows).
+    Pages hold PAYMENT_HISTORY_ROWS rows; `page` counts from 0.
+    """
     db = get_db()
-    query = (
-        db.table("attendance_view")
-        .select("*")
-        .gte("date", start_date.isoformat())
-        .lte("date", end_date.isoformat())
+    offset = page * PAYMENT_HISTORY_ROWS
+    res = (
+        db.table("worker_payments_view")
+        .select(",".join(PAY_COLUMNS), count="exact")
+        .order("date", desc=True)
+        .order("id", desc=True)
+        .range(offset, offset + PAYMENT_HISTORY_ROWS - 1)
+        .execute()
     )
-    res = query.order("date").execute()
-    if not res.data:
-        return pd.DataFrame()
-    df = pd.DataFrame(res.data)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+    return _payments_frame(res.data), res.count or 0
 
 
-def get_worker_payments_df(conn, worker_id=None):
+@st.cache_data(ttl=60, show_spinner=False)
+def get_worker_payments_range_df(start_date, end_date):
     db = get_db()
-    query = db.table("worker_payments_view").select("*")
-    if worker_id:
-        query = query.eq("worker_id", worker_id)
-    res = query.order("date").execute()
-    if not res.data:
+
+    def build_query():
+        return (
+            db.table("worker_payments_view")
+            .select(",".join(PAY_COLUMNS), count="exact")
+            .gte("date", start_date.isoformat())
+            .lte("date", end_date.isoformat())
+            .order("date")
+            .order("id")
+        )
+
+    return _payments_frame(fetch_all_rows(build_query))
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_dashboard_summary(for_date):
+    """One row of KPI totals computed by the dashboard_summary() SQL function."""
+    db = get_db()
+    res = db.rpc("dashboard_summary", {"p_today": for_date.isoformat()}).execute()
+    return res.data[0] if res.data else {}
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_daily_tx_summary(start_date, end_date):
+    """Per-day, per-type totals from the daily_tx_summary() SQL function: day, type, total."""
+    db = get_db()
+    params = {"p_start": start_date.isoformat(), "p_end": end_date.isoformat()}
+    rows = fetch_all_rows(
+        lambda: db.rpc("daily_tx_summary", params, count="exact").order("day").order("type")
+    )
+    if not rows:
         return pd.DataFrame()
-    df = pd.DataFrame(res.data)
-    df["date"] = pd.to_datetime(df["date"])
+    df = pd.DataFrame.from_records(rows, columns=["day", "type", "total"])
+    df["day"] = pd.to_datetime(df["day"], format="ISO8601", cache=True)
+    df["total"] = pd.to_numeric(df["total"])
     return df
 
 
-def get_worker_payments_range_df(conn, start_date, end_date):
+@st.cache_data(ttl=60, show_spinner=False)
+def get_expense_by_category(start_date, end_date):
+    """Expense totals per category from the expense_by_category() SQL function."""
     db = get_db()
-    query = (
-        db.table("worker_payments_view")
-        .select("*")
-        .gte("date", start_date.isoformat())
-        .lte("date", end_date.isoformat())
-    )
-    res = query.order("date").execute()
+    res = db.rpc("expense_by_category", {
+        "p_start": start_date.isoformat(),
+        "p_end": end_date.isoformat()
+    }).order("category").execute()
     if not res.data:
         return pd.DataFrame()
-    df = pd.DataFrame(res.data)
-    df["date"] = pd.to_datetime(df["date"])
+    df = pd.DataFrame.from_records(res.data, columns=["category", "total"])
+    df["total"] = pd.to_numeric(df["total"])
     return df
 
 
-def calculate_summary_metrics(conn):
-    """Calculate KPIs for the dashboard."""
-    today = date.today()
-    start_of_month = today.replace(day=1)
+# =========================
+# CACHE INVALIDATION
+# =========================
+
+def clear_worker_caches():
+    """Workers feed the attendance and payment views (name, role, rate)."""
+    get_workers_df.clear()
+    get_workers_minimal_df.clear()
+    clear_attendance_caches()
+    clear_payment_caches()
+
+
+def clear_attendance_caches():
+    get_attendance_df.clear()
+    get_attendance_range_df.clear()
+    get_dashboard_summary.clear()
+    calculate_payroll.clear()
+
+
+def clear_transaction_caches():
+    get_transactions_df.clear()
+    get_dashboard_summary.clear()
+    get_daily_tx_summary.clear()
+    get_expense_by_category.clear()
 
-    workers = get_workers_df(conn, active_only=True)
-    total_workers = len(workers)
 
-    att_today = get_attendance_df(conn, for_date=today)
-    present_today = len(att_today[att_today["status"] == "Present"]) if not att_today.empty else 0
-    absent_today = len(att_today[att_today["status"] == "Absent"]) if not att_today.empty else 0
+def clear_payment_caches():
+    get_worker_payments_df.clear()
+    get_worker_payments_range_df.clear()
+    calculate_payroll.clear()
 
-    tx_month = get_transactions_df(conn, start_date=start_of_month, end_date=today)
-    total_expense_month = 0.0
-    total_income_month = 0.0
 
-    if not tx_month.empty:
-        total_expense_month = tx_month[tx_month["type"] == "EXPENSE"]["amount"].sum()
-        total_income_month = tx_month[tx_month["type"] == "INCOME"]["amount"].sum()
+def calculate_summary_metrics(summary=None):
+    """Calculate KPIs for the dashboard (aggregated server-side)."""
+    if summary is None:
+        summary = get_dashboard_summary(date.today())
+
+    total_workers = int(summary.get("total_workers") or 0)
+    present_today = int(summary.get("present_today") or 0)
+    absent_today = int(summary.get("absent_today") or 0)
+    total_expense_month = float(summary.get("expense_month") or 0.0)
+    total_income_month = float(summary.get("income_month") or 0.0)
 
     profit_month = total_income_month - total_expense_month
 
@@ -287,29 +418,36 @@ def calculate_summary_metrics(conn):
     }
 
 
-def check_notifications(conn):
-    """Return notification messages for high usage / heavy flows."""
+def check_notifications(daily=None):
+    """
+    Return notification messages for high usage / heavy flows.
+    `daily` may be a pre-fetched get_daily_tx_summary() frame for the last 30 days.
+    """
     msgs = []
     today = date.today()
     last_30 = today - timedelta(days=30)
 
-    tx = get_transactions_df(conn, start_date=last_30, end_date=today)
-    if tx.empty:
+    if daily is None:
+        daily = get_daily_tx_summary(last_30, today)
+    if daily.empty:
         return msgs
 
-    tx_today = tx[tx["date"].dt.date == today]
-    today_expense = tx_today[tx_today["type"] == "EXPENSE"]["amount"].sum()
+    # Per-day totals are summed in Postgres; just lay them out by type.
+    daily = (
+        daily.set_index(["day", "type"])["total"]
+             .unstack(fill_value=0.0)
+             .reindex(columns=["EXPENSE", "INCOME"], fill_value=0.0)
+    )
+    today_ts = pd.Timestamp(today)
+    today_row = daily.loc[today_ts] if today_ts in daily.index else None
+    today_expense = today_row["EXPENSE"] if today_row is not None else 0.0
+    total_in_today = today_row["INCOME"] if today_row is not None else 0.0
 
-    if len(tx) > 0:
-        daily_expenses = tx[tx["type"] == "EXPENSE"].groupby(tx["date"].dt.date)["amount"].sum()
-        if len(daily_expenses) > 0:
-            avg_daily_expense = daily_expenses.mean()
-        else:
-            avg_daily_expense = 0
-    else:
-        avg_daily_expense = 0
+    # Average only over days that actually had expenses.
+    expense_days = daily.loc[daily["EXPENSE"] > 0, "EXPENSE"]
+    avg_daily_expense = expense_days.mean() if len(expense_days) > 0 else 0
 
-    expense_threshold = get_setting(conn, "expense_threshold",
+    expense_threshold = get_setting("expense_threshold",
                                     default=avg_daily_expense * 1.5 if avg_daily_expense else 0)
 
     if expense_threshold and today_expense > expense_threshold:
@@ -318,10 +456,9 @@ def check_notifications(conn):
         )
 
     total_out_today = today_expense
-    total_in_today = tx_today[tx_today["type"] == "INCOME"]["amount"].sum()
     total_flow_today = total_out_today + total_in_today
 
-    flow_threshold = get_setting(conn, "fund_flow_threshold",
+    flow_threshold = get_setting("fund_flow_threshold",
                                  default=(avg_daily_expense * 2) if avg_daily_expense else 0)
 
     if flow_threshold and total_flow_today > flow_threshold:
@@ -332,7 +469,8 @@ def check_notifications(conn):
     return msgs
 
 
-def calculate_payroll(conn, start_date, end_date):
+@st.cache_data(ttl=60, show_spinner=False)
+def calculate_payroll(start_date, end_date):
     """
     Calculate salary for each worker between start_date and end_date using hours + overtime logic.
     Rules:
@@ -341,86 +479,86 @@ def calculate_payroll(conn, start_date, end_date):
     - Half-Day: day_pay = 0.5 * daily_rate
     - Absent / Leave: day_pay = 0
     """
-    workers_df = get_workers_df(conn, active_only=True)
+    workers_df = get_workers_minimal_df(active_only=True)
     if workers_df.empty:
         return pd.DataFrame()
 
-    att_df = get_attendance_range_df(conn, start_date, end_date)
-    pay_df = get_worker_payments_range_df(conn, start_date, end_date)
-
-    rows = []
-    for _, w in workers_df.iterrows():
-        wid = w["id"]
-        w_name = w["name"]
-        rate = float(w["daily_rate"]) if w["daily_rate"] is not None else 0.0
-
-        w_att = att_df[att_df["worker_id"] == wid] if not att_df.empty else pd.DataFrame()
-
-        gross_salary = 0.0
-        days_present = 0
-        half_days = 0
-        overtime_hours_total = 0.0
-        worked_days_equivalent = 0.0
-
-        if not w_att.empty:
-            w_att_by_day = (
-                w_att.assign(att_day=w_att["date"].dt.date)
-                     .sort_values("date")
-                     .groupby("att_day")
-                     .last()
-                     .reset_index()
-            )
+    att_df = get_attendance_range_df(start_date, end_date)
+    pay_df = get_worker_payments_range_df(start_date, end_date)
 
-            for _, day_row in w_att_by_day.iterrows():
-                status = day_row["status"]
-                hours = day_row.get("hours")
-                hours = float(hours) if hours not in (None, "") else 8.0
-
-                if status == "Present":
-                    if hours <= 0:
-                        hours = 8.0
-                    base_hours = min(hours, 8.0)
-                    overtime_hours = max(0.0, hours - 8.0)
-
-                    base_pay = (base_hours / 8.0) * rate
-                    overtime_pay = overtime_hours * (rate / 8.0)
-                    day_pay = base_pay + overtime_pay
-
-                    gross_salary += day_pay
-                    days_present += 1 if base_hours > 0 else 0
-                    overtime_hours_total += overtime_hours
-                    worked_days_equivalent += (base_hours / 8.0) + (overtime_hours / 8.0)
-
-                elif status == "Half-Day":
-                    day_pay = 0.5 * rate
-                    gross_salary += day_pay
-                    half_days += 1
-                    worked_days_equivalent += 0.5
-
-        w_pay = pay_df[pay_df["worker_id"] == wid] if not pay_df.empty else pd.DataFrame()
-        advances = float(w_pay[w_pay["type"] == "ADVANCE"]["amount"].sum()) if not w_pay.empty else 0.0
-        payments = float(w_pay[w_pay["type"] == "PAYMENT"]["amount"].sum()) if not w_pay.empty else 0.0
-
-        net_payable = gross_salary - advances - payments
-
-        rows.append({
-            "worker_id": wid,
-            "worker_name": w_name,
-            "daily_rate": rate,
-            "days_present": days_present,
-            "half_days": half_days,
-            "overtime_hours": overtime_hours_total,
-            "worked_days_equivalent": round(worked_days_equivalent, 3),
-            "gross_salary": round(gross_salary, 2),
-            "total_advance": round(advances, 2),
-            "total_payment_done": round(payments, 2),
-            "net_payable": round(net_payable, 2)
-        })
+    workers = workers_df[["id", "name", "daily_rate"]].rename(
+        columns={"id": "worker_id", "name": "worker_name"}
+    )
+    workers["daily_rate"] = pd.to_numeric(workers["daily_rate"], errors="coerce").fillna(0.0)
 
-    payroll_df = pd.DataFrame(rows)
-    if payroll_df.empty:
-        return payroll_df
+    # ---- Attendance: one row per worker per day (latest entry wins) ----
+    att_cols = ["gross_salary", "days_present", "half_days", "overtime_hours", "worked_days_equivalent"]
+    if att_df.empty:
+        att_agg = pd.DataFrame(columns=att_cols, dtype=float)
+    else:
+        att = (
+            att_df.sort_values("date", kind="stable")
+                  .drop_duplicates(["worker_id", "date"], keep="last")
+                  [["worker_id", "status", "hours"]]
+                  .merge(workers[["worker_id", "daily_rate"]], on="worker_id")
+        )
+        is_present = att["status"] == "Present"
+        is_half = att["status"] == "Half-Day"
+        rate = att["daily_rate"]
+
+        hours = pd.to_numeric(att["hours"], errors="coerce").fillna(8.0)
+        hours = hours.where(hours > 0, 8.0)
+        overtime_h = (hours - 8.0).clip(lower=0.0)
+
+        # base pay + overtime pay (both at daily_rate / 8 per hour) == hours / 8 * rate
+        att = att.assign(
+            gross_salary=(hours / 8.0 * rate).where(is_present, 0.0) + (0.5 * rate).where(is_half, 0.0),
+            days_present=is_present.astype(int),
+            half_days=is_half.astype(int),
+            overtime_hours=overtime_h.where(is_present, 0.0),
+            worked_days_equivalent=(hours / 8.0).where(is_present, 0.0) + is_half * 0.5,
+        )
+        att_agg = att.groupby("worker_id")[att_cols].sum()
+
+    # ---- Advances / payments per worker ----
+    if pay_df.empty:
+        pay_agg = pd.DataFrame(columns=["ADVANCE", "PAYMENT"], dtype=float)
+    else:
+        pay_agg = (
+            pay_df.groupby(["worker_id", "type"])["amount"].sum()
+                  .unstack(fill_value=0.0)
+                  .reindex(columns=["ADVANCE", "PAYMENT"], fill_value=0.0)
+        )
+
+    payroll_df = (
+        workers.set_index("worker_id")
+               .join(att_agg)
+               .join(pay_agg.rename(columns={"ADVANCE": "total_advance", "PAYMENT": "total_payment_done"}))
+               .fillna(0.0)
+               .reset_index()
+    )
+    # Counts and ids fit in small ints; this trims the frame shipped to st.dataframe.
+    # Money columns stay float64 so paise survive on large amounts.
+    for col in ("worker_id", "days_present", "half_days"):
+        payroll_df[col] = pd.to_numeric(payroll_df[col].astype(int), downcast="integer")
+    payroll_df["net_payable"] = (
+        payroll_df["gross_salary"] - payroll_df["total_advance"] - payroll_df["total_payment_done"]
+    ).round(2)
+    payroll_df["worked_days_equivalent"] = payroll_df["worked_days_equivalent"].round(3)
+    payroll_df[["gross_salary", "total_advance", "total_payment_done"]] = (
+        payroll_df[["gross_salary", "total_advance", "total_payment_done"]].round(2)
+    )
+
+    payroll_df = payroll_df[[
+        "worker_id", "worker_name", "daily_rate", "days_present", "half_days",
+        "overtime_hours", "worked_days_equivalent", "gross_salary",
+        "total_advance", "total_payment_done", "net_payable",
+    ]]
     payroll_df = payroll_df.sort_values("worker_name")
+    # Selectbox labels for the payment form, built once per cache fill.
+    payroll_df["worker_label"] = (
+        payroll_df["worker_name"] + " (Net: ₹" + payroll_df["net_payable"].map("{:.2f}".format) + ")"
+    )
     return payroll_df
 
 # =========================
@@ -437,7 +575,10 @@ def check_login(username: str, password: str):
     stored_hash = res.data[0]["password_hash"]
     role = res.data[0].get("role", "user")
 
-    if stored_hash == hash_password(password):
+    if not stored_hash:
+        return False, None
+
+    if hmac.compare_digest(stored_hash, hash_password(password)):
         return True, role
     else:
         return False, None
@@ -491,54 +632,79 @@ def render_login_modal():
     st.stop()
 
 
+# =========================
+# UI HELPERS
+# =========================
+
+def build_worker_options(workers_df):
+    """Map selectbox labels "Name (ID: n)" to worker ids."""
+    ids = workers_df["id"].tolist()
+    names = workers_df["name"].tolist()
+    return {f"{n} (ID: {i})": i for n, i in zip(names, ids)}
+
+
+def csv_export(df, index=False, columns=None):
+    """Return a callable for st.download_button that builds the CSV on click."""
+    def build():
+        # Write UTF-8 bytes straight into the buffer; no intermediate str copy.
+        buf = io.BytesIO()
+        df.to_csv(buf, index=index, columns=columns, encoding="utf-8")
+        return buf.getvalue()
+    return build
+
+
 # =========================
 # UI: DASHBOARD PAGE
 # =========================
 
-def render_dashboard(conn):
+def render_dashboard():
     st.title("Technique Iron Works SAP")
 
-    notifications = check_notifications(conn)
+    # Fetch the widest (pre-aggregated) transaction window once; narrower
+    # views slice it locally. The requests are independent, so issue them concurrently.
+    today = date.today()
+    three_months_back = today - timedelta(days=90)
+    last_30 = today - timedelta(days=30)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        f_daily = ex.submit(get_daily_tx_summary, three_months_back, today)
+        f_att = ex.submit(get_attendance_df, today)
+        f_summary = ex.submit(get_dashboard_summary, today)
+        f_cat = ex.submit(get_expense_by_category, last_30, today)
+        daily_90, att_today, summary = f_daily.result(), f_att.result(), f_summary.result()
+        cat_30 = f_cat.result()
+
+    daily_30 = daily_90[daily_90["day"] >= pd.Timestamp(last_30)] if not daily_90.empty else daily_90
+    notifications = check_notifications(daily=daily_30)
     if notifications:
         for msg in notifications:
             st.warning("🔔 " + msg)
 
-    metrics = calculate_summary_metrics(conn)
+    metrics = calculate_summary_metrics(summary=summary)
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.caption("Total Active Workers")
-        st.markdown(f"<div class='big-metric'>{metrics['total_workers']}</div>", unsafe_allow_html=True)
+        st.metric("Total Active Workers", metrics["total_workers"])
     with col2:
-        st.caption("Present Today")
-        st.markdown(f"<div class='big-metric'>{metrics['present_today']}</div>", unsafe_allow_html=True)
+        st.metric("Present Today", metrics["present_today"])
     with col3:
-        st.caption("Absent Today")
-        st.markdown(f"<div class='big-metric'>{metrics['absent_today']}</div>", unsafe_allow_html=True)
+        st.metric("Absent Today", metrics["absent_today"])
     with col4:
-        st.caption("This Month Profit")
-        st.markdown(f"<div class='big-metric'>{metrics['profit_month']:.2f}</div>", unsafe_allow_html=True)
+        st.metric("This Month Profit", f"{metrics['profit_month']:.2f}")
 
     st.markdown("---")
 
-    today = date.today()
-    three_months_back = today - timedelta(days=90)
-    tx = get_transactions_df(conn, start_date=three_months_back, end_date=today)
-
     # =========================
     # ROLE BASED SUMMARY CARDS
     # =========================
 
     st.markdown("### Worker Presence by Role")
 
-    att_today = get_attendance_df(conn, for_date=date.today())
-
     if att_today.empty:
         st.info("No attendance data for today.")
     else:
         role_counts = (
             att_today[att_today["status"] == "Present"]
-            .groupby("role")["worker_id"]
+            .groupby("role", observed=True)["worker_id"]
             .count()
             .reset_index()
         )
@@ -547,43 +713,31 @@ def render_dashboard(conn):
             st.info("No workers present today.")
         else:
             cols = st.columns(min(4, len(role_counts)))
+            cards = [
+                ROLE_CARD_HTML.format(role=r, count=n)
+                for r, n in zip(role_counts["role"].tolist(), role_counts["worker_id"].tolist())
+            ]
+
+            # Card i goes to column i % n_cols; one markdown call per column.
+            for c, col in enumerate(cols):
+                with col:
+                    st.markdown("".join(cards[c::len(cols)]), unsafe_allow_html=True)
 
-            for (i, row) in role_counts.iterrows():
-                with cols[i % 4]:
-                    st.markdown(f"""
-                        <div style="
-                            padding: 10px;
-                            border-radius: 10px;
-                            background: #f1f5f9;
-                            text-align: center;
-                            margin-bottom: 10px;
-                            border-left: 5px solid #fa7f6b;
-                            color:black;
-                        ">
-                            <h4 style="margin: 0;">{row['role']}</h4>
-                            <p style="font-size: 26px; font-weight: bold;">{row['worker_id']}</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-
-    if tx.empty:
+    if daily_90.empty:
         st.info("No transactions data available yet. Add some in the Accounts section.")
         return
 
-    tx["month"] = tx["date"].dt.to_period("M").dt.to_timestamp()
-    monthly = tx.groupby(["month", "type"])["amount"].sum().reset_index()
-    monthly_pivot = monthly.pivot(index="month", columns="type", values="amount").fillna(0)
+    # Roll the per-day totals (at most two rows per day) up to months.
+    month = daily_90["day"].dt.to_period("M").dt.to_timestamp().rename("month")
+    monthly_pivot = daily_90.groupby([month, "type"])["total"].sum().unstack("type", fill_value=0)
 
     st.subheader("Income vs Expenses (Last 3 Months)")
     st.line_chart(monthly_pivot)
 
     st.subheader("Expenses by Category (Last 30 Days)")
-    last_30 = today - timedelta(days=30)
-    tx_30 = tx[tx["date"].dt.date >= last_30]
-    tx_30_exp = tx_30[tx_30["type"] == "EXPENSE"]
-
-    if not tx_30_exp.empty:
-        cat_exp = tx_30_exp.groupby("category")["amount"].sum().reset_index()
-        cat_exp = cat_exp.set_index("category")
+    # Filtered to EXPENSE and summed in Postgres.
+    if not cat_30.empty:
+        cat_exp = cat_30.rename(columns={"total": "amount"}).set_index("category")
         st.bar_chart(cat_exp)
     else:
         st.info("No expense data in the last 30 days.")
@@ -593,11 +747,14 @@ def render_dashboard(conn):
 # UI: WORKERS PAGE
 # =========================
 
-def render_workers(conn):
+def render_workers():
     db = get_db()
     st.title("Workers Management")
 
-    tab_add, tab_manage = st.tabs(["➕ Add Worker", "🛠 Manage Workers"])
+    # Lazy tabs: only the selected tab's body runs (and loads its data).
+    tab_add, tab_manage = st.tabs(
+        ["➕ Add Worker", "🛠 Manage Workers"], key="workers_tabs", on_change="rerun"
+    )
 
     # ---- Add Worker ----
     with tab_add:
@@ -640,95 +797,99 @@ def render_workers(conn):
                     "ifsc_code": ifsc_code,
                     "is_active": is_active,
                 }).execute()
+                clear_worker_caches()
                 st.success(f"Worker '{name}' added successfully.")
 
     # ---- Manage Workers ----
     with tab_manage:
-        st.subheader("Workers List & Update")
-
-        workers_df = get_workers_df(conn, active_only=False)
-        if workers_df.empty:
-            st.info("No workers added yet.")
-            return
-
-        st.dataframe(
-            workers_df[
-                [
-                    "id", "name", "father_name", "mobile", "role", "site_allocation",
-                    "join_date", "daily_rate",
-                    "account_number", "bank_name", "ifsc_code",
-                    "is_active"
-                ]
-            ],
-            use_container_width=True
-        )
+        if tab_manage.open:
+            st.subheader("Workers List & Update")
 
-        st.markdown("### Update Worker Details")
-        worker_options = {f"{row['name']} (ID: {row['id']})": row["id"] for _, row in workers_df.iterrows()}
-        selected_label = st.selectbox("Select a worker to update", options=list(worker_options.keys()))
-        selected_id = worker_options[selected_label]
-
-        w_row = workers_df[workers_df["id"] == selected_id].iloc[0]
-
-        with st.form("update_worker_form"):
-            st.subheader("Personal Details")
-            new_name = st.text_input("Name", value=w_row["name"])
-            new_father = st.text_input("Father's Name", value=w_row.get("father_name", "") or "")
-            new_mobile = st.text_input("Mobile Number", value=w_row.get("mobile", "") or "")
-            new_role = st.text_input("Role / Designation", value=w_row.get("role", "") or "")
-            new_site = st.text_input("Site Allocation", value=w_row.get("site_allocation", "") or "")
-
-            jd_raw = w_row.get("join_date")
-            try:
-                jd = datetime.strptime(jd_raw, "%Y-%m-%d").date() if jd_raw else date.today()
-            except Exception:
-                jd = date.today()
-            new_join_date = st.date_input("Joining Date", value=jd)
+            workers_df = get_workers_df(active_only=False)
+            if workers_df.empty:
+                st.info("No workers added yet.")
+                return
 
-            st.subheader("Account Details")
-            new_acc = st.text_input("Account Number", value=w_row.get("account_number", "") or "")
-            new_bank = st.text_input("Bank Name", value=w_row.get("bank_name", "") or "")
-            new_ifsc = st.text_input("IFSC Code", value=w_row.get("ifsc_code", "") or "")
+            st.dataframe(
+                workers_df[
+                    [
+                        "id", "name", "father_name", "mobile", "role", "site_allocation",
+                        "join_date", "daily_rate",
+                        "account_number", "bank_name", "ifsc_code",
+                        "is_active"
+                    ]
+                ],
+                use_container_width=True
+            )
 
-            st.subheader("Salary Details")
-            new_daily_rate = st.number_input("Per Day Rate (₹)", min_value=0.0, step=50.0,
-                                             value=float(w_row["daily_rate"] or 0.0))
-            new_active = st.checkbox("Active", value=bool(w_row["is_active"]))
-
-            col_save, col_remove = st.columns(2)
-            save = col_save.form_submit_button("Save Changes")
-            remove = col_remove.form_submit_button("Mark as Inactive")
-
-        if save:
-            db.table("workers").update({
-                "name": new_name,
-                "father_name": new_father,
-                "mobile": new_mobile,
-                "role": new_role,
-                "site_allocation": new_site,
-                "join_date": new_join_date.isoformat(),
-                "daily_rate": new_daily_rate,
-                "account_number": new_acc,
-                "bank_name": new_bank,
-                "ifsc_code": new_ifsc,
-                "is_active": new_active,
-            }).eq("id", selected_id).execute()
-            st.success("Worker details updated.")
-
-        if remove:
-            db.table("workers").update({"is_active": False}).eq("id", selected_id).execute()
-            st.warning(f"Worker ID {selected_id} marked as inactive.")
+            st.markdown("### Update Worker Details")
+            worker_options = build_worker_options(workers_df)
+            selected_label = st.selectbox("Select a worker to update", options=list(worker_options.keys()))
+            selected_id = worker_options[selected_label]
+
+            w_row = workers_df[workers_df["id"] == selected_id].iloc[0]
+
+            with st.form("update_worker_form"):
+                st.subheader("Personal Details")
+                new_name = st.text_input("Name", value=w_row["name"])
+                new_father = st.text_input("Father's Name", value=w_row.get("father_name", "") or "")
+                new_mobile = st.text_input("Mobile Number", value=w_row.get("mobile", "") or "")
+                new_role = st.text_input("Role / Designation", value=w_row.get("role", "") or "")
+                new_site = st.text_input("Site Allocation", value=w_row.get("site_allocation", "") or "")
+
+                jd_raw = w_row.get("join_date")
+                try:
+                    jd = date.fromisoformat(jd_raw) if isinstance(jd_raw, str) and jd_raw else date.today()
+                except ValueError:
+                    jd = date.today()
+                new_join_date = st.date_input("Joining Date", value=jd)
+
+                st.subheader("Account Details")
+                new_acc = st.text_input("Account Number", value=w_row.get("account_number", "") or "")
+                new_bank = st.text_input("Bank Name", value=w_row.get("bank_name", "") or "")
+                new_ifsc = st.text_input("IFSC Code", value=w_row.get("ifsc_code", "") or "")
+
+                st.subheader("Salary Details")
+                new_daily_rate = st.number_input("Per Day Rate (₹)", min_value=0.0, step=50.0,
+                                                 value=float(w_row["daily_rate"] or 0.0))
+                new_active = st.checkbox("Active", value=bool(w_row["is_active"]))
+
+                col_save, col_remove = st.columns(2)
+                save = col_save.form_submit_button("Save Changes")
+                remove = col_remove.form_submit_button("Mark as Inactive")
+
+            if save:
+                db.table("workers").update({
+                    "name": new_name,
+                    "father_name": new_father,
+                    "mobile": new_mobile,
+                    "role": new_role,
+                    "site_allocation": new_site,
+                    "join_date": new_join_date.isoformat(),
+                    "daily_rate": new_daily_rate,
+                    "account_number": new_acc,
+                    "bank_name": new_bank,
+                    "ifsc_code": new_ifsc,
+                    "is_active": new_active,
+                }).eq("id", selected_id).execute()
+                clear_worker_caches()
+                st.success("Worker details updated.")
+
+            if remove:
+                db.table("workers").update({"is_active": False}).eq("id", selected_id).execute()
+                clear_worker_caches()
+                st.warning(f"Worker ID {selected_id} marked as inactive.")
 
 
 # =========================
 # UI: ATTENDANCE PAGE
 # =========================
 
-def render_attendance(conn):
+def render_attendance():
     db = get_db()
     st.title("Attendance Management")
 
-    workers_df = get_workers_df(conn, active_only=True)
+    workers_df = get_workers_minimal_df(active_only=True)
     if workers_df.empty:
         st.info("No active workers found. Please add workers first in the Workers section.")
         return
@@ -740,15 +901,16 @@ def render_attendance(conn):
 
         with st.form("attendance_form"):
             att_date = st.date_input("Date", value=date.today())
+            worker_options = build_worker_options(workers_df)
             worker_label = st.selectbox(
                 "Worker",
-                options=[f"{row['name']} (ID: {row['id']})" for _, row in workers_df.iterrows()]
+                options=list(worker_options.keys())
             )
-            worker_id = int(worker_label.split("ID:")[1].strip(") "))
+            worker_id = worker_options[worker_label]
 
             status = st.selectbox(
                 "Status",
-                options=["Present", "Absent", "Leave", "Half-Day"],
+                options=ATT_STATUSES,
                 index=0
             )
             hours = st.number_input("Hours Worked (optional)", min_value=0.0, step=0.5, value=8.0)
@@ -756,28 +918,37 @@ def render_attendance(conn):
             submit_att = st.form_submit_button("Save Attendance")
 
         if submit_att:
-            res = db.table("attendance").select("id").eq("worker_id", worker_id).eq("date", att_date.isoformat()).execute()
-            if res.data:
-                att_id = res.data[0]["id"]
-                db.table("attendance").update({
-                    "status": status,
-                    "hours": hours
-                }).eq("id", att_id).execute()
-                st.success("Attendance updated for selected worker and date.")
-            else:
-                db.table("attendance").insert({
-                    "worker_id": worker_id,
-                    "date": att_date.isoformat(),
-                    "status": status,
-                    "hours": hours
-                }).execute()
-                st.success("Attendance marked successfully.")
+            # Insert or overwrite the (worker_id, date) row in one round-trip.
+            db.table("attendance").upsert({
+                "worker_id": worker_id,
+                "date": att_date.isoformat(),
+                "status": status,
+                "hours": hours
+            }, on_conflict="worker_id,date").execute()
+            clear_attendance_caches()
+            st.success("Attendance saved for selected worker and date.")
+
+        st.markdown("---")
+        st.subheader("Mark All Present")
+
+        with st.form("mark_all_present_form"):
+            bulk_date = st.date_input("Date", value=date.today(), key="bulk_att_date")
+            submit_all = st.form_submit_button("Mark All Active Workers Present")
+
+        if submit_all:
+            # One bulk request; workers already marked for the day keep their entry.
+            db.table("attendance").upsert([
+                {"worker_id": wid, "date": bulk_date.isoformat(), "status": "Present", "hours": 8.0}
+                for wid in workers_df["id"].tolist()
+            ], on_conflict="worker_id,date", ignore_duplicates=True).execute()
+            clear_attendance_caches()
+            st.success("All active workers without an entry for that date were marked present.")
 
     with col_right:
         st.subheader("Attendance Overview")
 
         view_date = st.date_input("View date", value=date.today(), key="view_date_att")
-        att_df = get_attendance_df(conn, for_date=view_date)
+        att_df = get_attendance_df(for_date=view_date)
 
         if att_df.empty:
             st.info("No attendance records for selected date.")
@@ -789,12 +960,17 @@ def render_attendance(conn):
         # -----------------------------
         st.markdown("### Modify Existing Attendance")
 
-        att_edit_df = get_attendance_df(conn, for_date=view_date)
+        att_edit_df = att_df.copy()
 
         if not att_edit_df.empty:
             # Create a selection list
-            att_edit_df["label"] = att_edit_df.apply(
-                lambda r: f"{r['worker_name']} — {r['status']} ({r['hours']} hrs)", axis=1
+            # object + map(str), not astype(str): the pandas string dtype keeps
+            # NaN missing, which would turn the whole label into NaN.
+            parts = att_edit_df[["worker_name", "status", "hours"]].astype(object)
+            att_edit_df["label"] = (
+                parts["worker_name"].map(str)
+                + " — " + parts["status"].map(str)
+                + " (" + parts["hours"].map(str) + " hrs)"
             )
 
             selected_att = st.selectbox(
@@ -806,8 +982,8 @@ def render_attendance(conn):
 
             new_status = st.selectbox(
                 "Update Status",
-                options=["Present", "Absent", "Leave", "Half-Day"],
-                index=["Present", "Absent", "Leave", "Half-Day"].index(selected_row["status"])
+                options=ATT_STATUSES,
+                index=ATT_STATUSES.index(selected_row["status"])
             )
 
             new_hours = st.number_input(
@@ -822,15 +998,17 @@ def render_attendance(conn):
             delete_btn = col_d.button("Delete Record")
 
             if update_btn:
-                get_db().table("attendance").update({
+                db.table("attendance").update({
                     "status": new_status,
                     "hours": new_hours
                 }).eq("id", selected_row["id"]).execute()
+                clear_attendance_caches()
                 st.success("Attendance updated.")
                 st.rerun()
 
             if delete_btn:
-                get_db().table("attendance").delete().eq("id", selected_row["id"]).execute()
+                db.table("attendance").delete().eq("id", selected_row["id"]).execute()
+                clear_attendance_caches()
                 st.warning("Attendance record deleted.")
                 st.rerun()
 
@@ -843,199 +1021,153 @@ def render_attendance(conn):
 # UI: ACCOUNTS PAGE
 # =========================
 
-def render_accounts(conn):
+def render_accounts():
     db = get_db()
     st.title("Accounts & Transactions")
 
-    tab_tx, tab_pay = st.tabs(["💸 Business Transactions", "👷 Worker Payments & Advances"])
+    # Lazy tabs: only the selected tab's body runs (and loads its data).
+    tab_tx, tab_pay = st.tabs(
+        ["💸 Business Transactions", "👷 Worker Payments & Advances"],
+        key="accounts_tabs", on_change="rerun"
+    )
 
     # ---- Business Transactions ----
     with tab_tx:
-        st.subheader("Add Transaction (Purchase / Expense / Income, etc.)")
+        if tab_tx.open:
+            st.subheader("Add Transaction (Purchase / Expense / Income, etc.)")
 
-        with st.form("tx_form"):
-            tx_date = st.date_input("Date", value=date.today())
-            tx_type = st.selectbox("Type", ["EXPENSE", "INCOME"])
-            category = st.text_input("Category (e.g., Purchase, Rent, Material, Other)")
-            amount = st.number_input("Amount (₹)", min_value=0.0, step=100.0)
-            description = st.text_area("Description / Notes", height=80)
+            with st.form("tx_form"):
+                tx_date = st.date_input("Date", value=date.today())
+                tx_type = st.selectbox("Type", ["EXPENSE", "INCOME"])
+                category = st.text_input("Category (e.g., Purchase, Rent, Material, Other)")
+                amount = st.number_input("Amount (₹)", min_value=0.0, step=100.0)
+                description = st.text_area("Description / Notes", height=80)
 
-            submit_tx = st.form_submit_button("Save Transaction")
+                submit_tx = st.form_submit_button("Save Transaction")
 
-        if submit_tx:
-            if not category or amount <= 0:
-                st.error("Category and positive Amount are required.")
-            else:
-                db.table("transactions").insert({
-                    "date": tx_date.isoformat(),
-                    "type": tx_type,
-                    "category": category,
-                    "amount": amount,
-                    "description": description
-                }).execute()
-                st.success("Transaction saved successfully.")
+            if submit_tx:
+                if not category or amount <= 0:
+                    st.error("Category and positive Amount are required.")
+                else:
+                    db.table("transactions").insert({
+                        "date": tx_date.isoformat(),
+                        "type": tx_type,
+                        "category": category,
+                        "amount": amount,
+                        "description": description
+                    }).execute()
+                    clear_transaction_caches()
+                    st.success("Transaction saved successfully.")
 
-        st.markdown("---")
-        st.subheader("Recent Transactions")
+            st.markdown("---")
+            st.subheader("Recent Transactions")
 
-        start = st.date_input("From", value=date.today() - timedelta(days=30), key="tx_from")
-        end = st.date_input("To", value=date.today(), key="tx_to")
+            start = st.date_input("From", value=date.today() - timedelta(days=30), key="tx_from")
+            end = st.date_input("To", value=date.today(), key="tx_to")
 
-        tx_df = get_transactions_df(conn, start_date=start, end_date=end)
-        if tx_df.empty:
-            st.info("No transactions in selected period.")
-        else:
-            st.dataframe(
-                tx_df[["date", "type", "category", "amount", "description"]],
-                use_container_width=True
-            )
+            tx_df = get_transactions_df(start_date=start, end_date=end)
+            if tx_df.empty:
+                st.info("No transactions in selected period.")
+            else:
+                st.dataframe(
+                    tx_df[["date", "type", "category", "amount", "description"]],
+                    use_container_width=True
+                )
 
-            csv = tx_df.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                label="Download Transactions as CSV",
-                data=csv,
-                file_name=f"transactions_{start}_to_{end}.csv",
-                mime="text/csv"
-            )
+                st.download_button(
+                    label="Download Transactions as CSV",
+                    data=csv_export(tx_df),
+                    file_name=f"transactions_{start}_to_{end}.csv",
+                    mime="text/csv"
+                )
 
     # ---- Worker Payments & Advances ----
     with tab_pay:
-        st.subheader("Record Worker Payment / Advance")
+        if tab_pay.open:
+            st.subheader("Record Worker Payment / Advance")
 
-        workers_df = get_workers_df(conn, active_only=False)
-        if workers_df.empty:
-            st.info("No workers found.")
-        else:
-            worker_option = st.selectbox(
-                "Worker",
-                options=[f"{row['name']} (ID: {row['id']})" for _, row in workers_df.iterrows()],
-                key="pay_worker"
-            )
-            worker_id = int(worker_option.split("ID:")[1].strip(") "))
-
-            with st.form("pay_form"):
-                pay_date = st.date_input("Date", value=date.today())
-                pay_type = st.selectbox("Type", ["PAYMENT", "ADVANCE"])
-                pay_amount = st.number_input("Amount (₹)", min_value=0.0, step=100.0)
-                notes = st.text_area("Notes", height=70)
-
-                submit_pay = st.form_submit_button("Save Payment")
-
-            if submit_pay:
-                if pay_amount <= 0:
-                    st.error("Amount must be > 0.")
-                else:
-                    db.table("worker_payments").insert({
-                        "worker_id": worker_id,
-                        "date": pay_date.isoformat(),
-                        "amount": pay_amount,
-                        "type": pay_type,
-                        "notes": notes
-                    }).execute()
-                    st.success("Worker payment record saved.")
-
-            st.markdown("---")
-            st.subheader("Payment History")
-
-            wp_df = get_worker_payments_df(conn, worker_id=None)
-            if wp_df.empty:
-                st.info("No payment records yet.")
+            workers_df = get_workers_minimal_df(active_only=False)
+            if workers_df.empty:
+                st.info("No workers found.")
             else:
-                st.dataframe(
-                    wp_df[["date", "worker_name", "type", "amount", "notes"]],
-                    use_container_width=True
+                worker_options = build_worker_options(workers_df)
+                worker_option = st.selectbox(
+                    "Worker",
+                    options=list(worker_options.keys()),
+                    key="pay_worker"
                 )
+                worker_id = worker_options[worker_option]
+
+                with st.form("pay_form"):
+                    pay_date = st.date_input("Date", value=date.today())
+                    pay_type = st.selectbox("Type", ["PAYMENT", "ADVANCE"])
+                    pay_amount = st.number_input("Amount (₹)", min_value=0.0, step=100.0)
+                    notes = st.text_area("Notes", height=70)
+
+                    submit_pay = st.form_submit_button("Save Payment")
+
+                if submit_pay:
+                    if pay_amount <= 0:
+                        st.error("Amount must be > 0.")
+                    else:
+                        db.table("worker_payments").insert({
+                            "worker_id": worker_id,
+                            "date": pay_date.isoformat(),
+                            "amount": pay_amount,
+                            "type": pay_type,
+                            "notes": notes
+                        }).execute()
+                        clear_payment_caches()
+                        st.success("Worker payment record saved.")
+
+                st.markdown("---")
+                st.subheader("Payment History")
+
+                page = st.number_input(
+                    "Page", min_value=1, value=1, step=1, key="pay_history_page"
+                )
+                wp_df, total_payments = get_worker_payments_df(page=int(page) - 1)
+                if total_payments == 0:
+                    st.info("No payment records yet.")
+                elif wp_df.empty:
+                    st.info(f"No payments on page {int(page)}.")
+                else:
+                    first = (int(page) - 1) * PAYMENT_HISTORY_ROWS + 1
+                    st.caption(
+                        f"Payments {first}–{first + len(wp_df) - 1} of {total_payments}, newest first."
+                    )
+                    st.dataframe(
+                        wp_df[["date", "worker_name", "type", "amount", "notes"]],
+                        use_container_width=True
+                    )
 
 
 # =========================
 # UI: PAYROLL PAGE
 # =========================
 
-def render_payroll(conn):
+@st.fragment
+def record_salary_payment(payroll_df, start, end):
+    """Worker selector + payment form; interacting with it reruns only this fragment."""
     db = get_db()
-    st.title("Payroll (Salary Calculation)")
 
-    col1, col2 = st.columns(2)
-    with col1:
-        start = st.date_input("From", value=date.today().replace(day=1))
-    with col2:
-        end = st.date_input("To", value=date.today())
-
-    payroll_df = calculate_payroll(conn, start, end)
-
-    if payroll_df.empty:
-        st.info("No payroll data. Ensure workers, attendance, and daily rates are added.")
-        return
-
-    subtotal_gross = float(payroll_df["gross_salary"].sum())
-    total_advances = float(payroll_df["total_advance"].sum())
-    total_payments_done = float(payroll_df["total_payment_done"].sum())
-    net_total_payable = float(payroll_df["net_payable"].sum())
-
-    st.subheader("Payroll Summary")
-    k1, k2, k3, k4 = st.columns(4)
-    with k1:
-        st.caption("Subtotal (Gross Salaries)")
-        st.markdown(f"<div class='big-metric'>₹{subtotal_gross:.2f}</div>", unsafe_allow_html=True)
-    with k2:
-        st.caption("Total Advances")
-        st.markdown(f"<div class='big-metric'>₹{total_advances:.2f}</div>", unsafe_allow_html=True)
-    with k3:
-        st.caption("Total Payments Done")
-        st.markdown(f"<div class='big-metric'>₹{total_payments_done:.2f}</div>", unsafe_allow_html=True)
-    with k4:
-        st.caption("Net Total Payable")
-        st.markdown(f"<div class='big-metric'>₹{net_total_payable:.2f}</div>", unsafe_allow_html=True)
-
-    st.markdown("---")
-    st.subheader("Calculated Payroll Details")
-
-    display_cols = [
-        "worker_name",
-        "daily_rate",
-        "days_present",
-        "half_days",
-        "overtime_hours",
-        "worked_days_equivalent",
-        "gross_salary",
-        "total_advance",
-        "total_payment_done",
-        "net_payable",
-    ]
-    df_show = payroll_df[display_cols].rename(columns={
-        "worker_name": "Worker",
-        "daily_rate": "Per Day Rate",
-        "days_present": "Full Present Days",
-        "half_days": "Half Days",
-        "overtime_hours": "Overtime Hours",
-        "worked_days_equivalent": "Worked Days (Eq.)",
-        "gross_salary": "Gross Salary",
-        "total_advance": "Total Advances",
-        "total_payment_done": "Payments Done",
-        "net_payable": "Net Payable",
-    })
-    st.dataframe(df_show, use_container_width=True)
-
-    csv = payroll_df.to_csv(index=False).encode("utf-8")
-    st.download_button(
-        label="⬇ Download Payroll Summary as CSV",
-        data=csv,
-        file_name=f"payroll_{start}_to_{end}.csv",
-        mime="text/csv"
-    )
-
-    st.markdown("---")
-    st.subheader("Record Salary Payment for a Worker")
-
-    worker_options = {
-        f"{row['worker_name']} (Net: ₹{row['net_payable']:.2f})": row["worker_id"]
-        for _, row in payroll_df.iterrows()
-    }
+    flash = st.session_state.pop("payroll_flash", None)
+    if flash:
+        st.success(flash)
+
+    # label -> (worker_id, name, net_payable), so the selection needs no row lookup.
+    worker_options = dict(zip(
+        payroll_df["worker_label"].tolist(),
+        zip(
+            payroll_df["worker_id"].tolist(),
+            payroll_df["worker_name"].tolist(),
+            payroll_df["net_payable"].tolist(),
+        ),
+    ))
     selected_label = st.selectbox("Select worker to pay", options=list(worker_options.keys()))
-    selected_id = worker_options[selected_label]
+    selected_id, selected_name, selected_net = worker_options[selected_label]
 
-    selected_row = payroll_df[payroll_df["worker_id"] == selected_id].iloc[0]
-    suggested_amount = max(selected_row["net_payable"], 0.0)
+    suggested_amount = max(selected_net, 0.0)
 
     with st.form("payroll_payment_form"):
         pay_date = st.date_input("Payment Date", value=date.today(), key="payroll_pay_date")
@@ -1063,62 +1195,145 @@ def render_payroll(conn):
                 "type": "PAYMENT",
                 "notes": notes
             }).execute()
-            st.success(
-                f"Salary payment of ₹{amount_to_pay:.2f} recorded for {selected_row['worker_name']}."
+            clear_payment_caches()
+            # Full rerun so the payroll table and net amounts above pick up the payment.
+            st.session_state.payroll_flash = (
+                f"Salary payment of ₹{amount_to_pay:.2f} recorded for {selected_name}."
             )
+            st.rerun()
+
+
+def render_payroll():
+    st.title("Payroll (Salary Calculation)")
+
+    # Dates only take effect on "Apply", so picking them doesn't recompute payroll.
+    with st.form("payroll_range_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            start = st.date_input("From", value=date.today().replace(day=1))
+        with col2:
+            end = st.date_input("To", value=date.today())
+        st.form_submit_button("Apply")
+
+    payroll_df = calculate_payroll(start, end)
+
+    if payroll_df.empty:
+        st.info("No payroll data. Ensure workers, attendance, and daily rates are added.")
+        return
+
+    subtotal_gross, total_advances, total_payments_done, net_total_payable = (
+        payroll_df[["gross_salary", "total_advance", "total_payment_done", "net_payable"]]
+        .sum()
+        .tolist()
+    )
+
+    st.subheader("Payroll Summary")
+    k1, k2, k3, k4 = st.columns(4)
+    with k1:
+        st.metric("Subtotal (Gross Salaries)", f"₹{subtotal_gross:.2f}")
+    with k2:
+        st.metric("Total Advances", f"₹{total_advances:.2f}")
+    with k3:
+        st.metric("Total Payments Done", f"₹{total_payments_done:.2f}")
+    with k4:
+        st.metric("Net Total Payable", f"₹{net_total_payable:.2f}")
+
+    st.markdown("---")
+    st.subheader("Calculated Payroll Details")
+
+    def money(label):
+        return st.column_config.NumberColumn(label, format="₹%.2f")
+
+    # Labels live in column_config, so the cached frame is shown as-is (no rename copy).
+    payroll_columns = {
+        "worker_name": st.column_config.Column("Worker"),
+        "daily_rate": money("Per Day Rate"),
+        "days_present": st.column_config.Column("Full Present Days"),
+        "half_days": st.column_config.Column("Half Days"),
+        "overtime_hours": st.column_config.Column("Overtime Hours"),
+        "worked_days_equivalent": st.column_config.Column("Worked Days (Eq.)"),
+        "gross_salary": money("Gross Salary"),
+        "total_advance": money("Total Advances"),
+        "total_payment_done": money("Payments Done"),
+        "net_payable": money("Net Payable"),
+    }
+    st.dataframe(
+        payroll_df,
+        use_container_width=True,
+        hide_index=True,
+        column_order=list(payroll_columns),
+        column_config=payroll_columns,
+    )
+
+    st.download_button(
+        label="⬇ Download Payroll Summary as CSV",
+        data=csv_export(payroll_df, columns=list(payroll_columns)),
+        file_name=f"payroll_{start}_to_{end}.csv",
+        mime="text/csv"
+    )
+
+    st.markdown("---")
+    st.subheader("Record Salary Payment for a Worker")
+
+    record_salary_payment(payroll_df, start, end)
 
 
 # =========================
 # UI: REPORTS & INSIGHTS
 # =========================
 
-def render_reports(conn):
+def render_reports():
     st.title("Reports & Daily Insights")
 
-    col1, col2 = st.columns(2)
-    with col1:
-        start = st.date_input("Report From", value=date.today() - timedelta(days=7))
-    with col2:
-        end = st.date_input("Report To", value=date.today())
-
-    tx_df = get_transactions_df(conn, start_date=start, end_date=end)
-    if tx_df.empty:
+    with st.form("report_range_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            start = st.date_input("Report From", value=date.today() - timedelta(days=7))
+        with col2:
+            end = st.date_input("Report To", value=date.today())
+        st.form_submit_button("Apply")
+
+    # Aggregated in Postgres: at most one row per day and type.
+    daily = get_daily_tx_summary(start, end)
+    if daily.empty:
         st.info("No transactions in this period.")
         return
 
-    total_income = tx_df[tx_df["type"] == "INCOME"]["amount"].sum()
-    total_expense = tx_df[tx_df["type"] == "EXPENSE"]["amount"].sum()
+    totals = daily.groupby("type")["total"].sum()
+    total_income = float(totals.get("INCOME", 0))
+    total_expense = float(totals.get("EXPENSE", 0))
     profit = total_income - total_expense
 
     col_k1, col_k2, col_k3 = st.columns(3)
     with col_k1:
-        st.caption("Total Income")
-        st.markdown(f"<div class='big-metric'>₹{total_income:.2f}</div>", unsafe_allow_html=True)
+        st.metric("Total Income", f"₹{total_income:.2f}")
     with col_k2:
-        st.caption("Total Expense")
-        st.markdown(f"<div class='big-metric'>₹{total_expense:.2f}</div>", unsafe_allow_html=True)
+        st.metric("Total Expense", f"₹{total_expense:.2f}")
     with col_k3:
-        st.caption("Net Profit")
-        st.markdown(f"<div class='big-metric'>₹{profit:.2f}</div>", unsafe_allow_html=True)
+        st.metric("Net Profit", f"₹{profit:.2f}")
 
     st.markdown("---")
 
-    tx_df["day"] = tx_df["date"].dt.date
-    daily_summary = tx_df.pivot_table(
-        index="day",
-        columns="type",
-        values="amount",
-        aggfunc="sum"
-    ).fillna(0)
-    daily_summary["PROFIT"] = daily_summary.get("INCOME", 0) - daily_summary.get("EXPENSE", 0)
+    # "day" stays datetime64 (midnight values), so grouping and the chart axis stay numeric.
+    daily_summary = (
+        daily.set_index(["day", "type"])["total"]
+             .unstack("type", fill_value=0)
+             .reindex(columns=["EXPENSE", "INCOME"], fill_value=0)
+    )
+    daily_summary["PROFIT"] = (
+        daily_summary["INCOME"].to_numpy() - daily_summary["EXPENSE"].to_numpy()
+    )
 
     st.subheader("Daily Profit & Loss")
-    st.dataframe(daily_summary, use_container_width=True)
+    st.dataframe(
+        daily_summary,
+        use_container_width=True,
+        column_config={"_index": st.column_config.DateColumn("day")},
+    )
 
-    csv_daily = daily_summary.reset_index().to_csv(index=False).encode("utf-8")
     st.download_button(
         label="Download Daily Summary as CSV",
-        data=csv_daily,
+        data=csv_export(daily_summary, index=True),
         file_name=f"daily_summary_{start}_to_{end}.csv",
         mime="text/csv"
     )
@@ -1127,9 +1342,9 @@ def render_reports(conn):
     st.line_chart(daily_summary["PROFIT"])
 
     st.subheader("Top Expense Categories")
-    exp = tx_df[tx_df["type"] == "EXPENSE"]
-    if not exp.empty:
-        cat = exp.groupby("category")["amount"].sum().sort_values(ascending=False)
+    cat_df = get_expense_by_category(start, end)
+    if not cat_df.empty:
+        cat = cat_df.set_index("category")["total"].sort_values(ascending=False)
         st.bar_chart(cat)
     else:
         st.info("No expense records in this period.")
@@ -1139,13 +1354,13 @@ def render_reports(conn):
 # UI: SETTINGS PAGE
 # =========================
 
-def render_settings(conn):
+def render_settings():
     st.title("Settings & Notifications Thresholds")
 
     st.subheader("Notification Thresholds")
 
-    current_expense_th = get_setting(conn, "expense_threshold", default=0)
-    current_flow_th = get_setting(conn, "fund_flow_threshold", default=0)
+    current_expense_th = get_setting("expense_threshold", default=0)
+    current_flow_th = get_setting("fund_flow_threshold", default=0)
 
     with st.form("settings_form"):
         expense_th = st.number_input(
@@ -1166,8 +1381,10 @@ def render_settings(conn):
         save = st.form_submit_button("Save Settings")
 
     if save:
-        set_setting(conn, "expense_threshold", expense_th)
-        set_setting(conn, "fund_flow_threshold", flow_th)
+        set_settings({
+            "expense_threshold": expense_th,
+            "fund_flow_threshold": flow_th,
+        })
         st.success("Settings updated successfully.")
 
 
@@ -1189,75 +1406,28 @@ def main():
         # Do not render rest of app until logged in
         return
 
-    conn = None  # kept for compatibility with function signatures
-
-    st.sidebar.title("Navigation")
-
-    def nav_button(label, requires_admin=False):
-        user_role = st.session_state.get("role", "user")
-    
-        locked = (requires_admin and user_role != "admin")
-        display_label = label + (" 🔒" if locked else "")
-    
-        is_active = (st.session_state.active_page == label)
-    
-        container = st.sidebar.container()
-    
-        if is_active:
-            container.markdown("<div class='active-tab'>", unsafe_allow_html=True)
-        else:
-            container.markdown("<div>", unsafe_allow_html=True)
-    
-        if container.button(display_label):
-            st.session_state.active_page = label
-
-        container.markdown("</div>", unsafe_allow_html=True)
-
-        
-
-    if "active_page" not in st.session_state:
-        st.session_state.active_page = "Dashboard"
-
-    nav_button("Dashboard")
-    nav_button("Workers")                           # user: view only
-    nav_button("Attendance")                        # user: view only
-    nav_button("Accounts", requires_admin=True)     # locked for users
-    nav_button("Payroll", requires_admin=True)      # locked
-    nav_button("Reports & Insights", requires_admin=True)
-    nav_button("Settings", requires_admin=True)
-
-
-    page = st.session_state.active_page
-    role = st.session_state.get("role", "user")
-    
-    def require_admin():
-        st.error("Access Denied — Admin Only Section")
-        st.stop()
-    
-    if page == "Dashboard":
-        render_dashboard(conn)
-    
-    elif page == "Workers":
-        render_workers(conn)
-    
-    elif page == "Attendance":
-        render_attendance(conn)
-    
-    elif page == "Accounts":
-        if role != "admin": require_admin()
-        render_accounts(conn)
-    
-    elif page == "Payroll":
-        if role != "admin": require_admin()
-        render_payroll(conn)
-    
-    elif page == "Reports & Insights":
-        if role != "admin": require_admin()
-        render_reports(conn)
-    
-    elif page == "Settings":
-        if role != "admin": require_admin()
-        render_settings(conn)
+    is_admin = st.session_state.get("role", "user") == "admin"
+
+    def admin_page(render, title, url_path):
+        """Admin-only page; users still see it in the menu, marked locked."""
+        def page():
+            if not is_admin:
+                st.error("Access Denied — Admin Only Section")
+                st.stop()
+            render()
+        return st.Page(page, title=title + ("" if is_admin else " 🔒"), url_path=url_path)
+
+    # Streamlit draws the sidebar menu and runs only the selected page.
+    page = st.navigation([
+        st.Page(render_dashboard, title="Dashboard", default=True),
+        st.Page(render_workers, title="Workers", url_path="workers"),           # user: view only
+        st.Page(render_attendance, title="Attendance", url_path="attendance"),  # user: view only
+        admin_page(render_accounts, "Accounts", "accounts"),
+        admin_page(render_payroll, "Payroll", "payroll"),
+        admin_page(render_reports, "Reports & Insights", "reports"),
+        admin_page(render_settings, "Settings", "settings"),
+    ])
+    page.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+-- Server-side KPI aggregates for the dashboard.
+-- Returns one row of totals instead of shipping every transaction to the client.
+
+create or replace function dashboard_summary(p_today date)
+returns table (
+    total_workers int,
+    present_today int,
+    absent_today int,
+    expense_month numeric,
+    income_month numeric
+)
+language sql
+stable
+as $$
+    with tx as (
+        select
+            coalesce(sum(amount) filter (where type = 'EXPENSE'), 0) as expense_month,
+            coalesce(sum(amount) filter (where type = 'INCOME'), 0) as income_month
+        from transactions
+        where date >= date_trunc('month', p_today)::date
+          and date <= p_today
+    ),
+    att as (
+        select
+            count(*) filter (where status = 'Present')::int as present_today,
+            count(*) filter (where status = 'Absent')::int as absent_today
+        from attendance_view
+        where date = p_today
+    )
+    select
+        (select count(*)::int from workers where is_active),
+        att.present_today,
+        att.absent_today,
+        tx.expense_month,
+        tx.income_month
+    from tx, att;
+$$;
+
+
+create or replace function expense_totals(p_today date, p_fy_start date)
+returns table (
+    today_expense numeric,
+    month_expense numeric,
+    fy_expense numeric
+)
+language sql
+stable
+as $$
+    select
+        coalesce(sum(amount) filter (where date = p_today), 0),
+        coalesce(sum(amount) filter (where date >= date_trunc('month', p_today)::date), 0),
+        coalesce(sum(amount), 0)
+    from transactions
+    where type = 'EXPENSE'
+      and date >= p_fy_start
+      and date <= p_today;
+$$;
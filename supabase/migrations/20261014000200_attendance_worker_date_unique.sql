@@ -0,0 +1,12 @@
+-- One attendance row per worker per day, so the app can upsert
+-- with on_conflict=(worker_id, date) instead of SELECT-then-INSERT/UPDATE.
+
+-- Keep the latest row where duplicates already exist.
+delete from attendance a
+using attendance b
+where a.worker_id = b.worker_id
+  and a.date = b.date
+  and a.id < b.id;
+
+alter table attendance
+    add constraint attendance_worker_id_date_key unique (worker_id, date);
@@ -0,0 +1,34 @@
+-- Pre-aggregated transaction totals for the Reports page.
+
+create or replace function daily_tx_summary(p_start date, p_end date)
+returns table (
+    day date,
+    type text,
+    total numeric
+)
+language sql
+stable
+as $$
+    select t.date, t.type::text, sum(t.amount)
+    from transactions t
+    where t.date >= p_start
+      and t.date <= p_end
+    group by t.date, t.type;
+$$;
+
+
+create or replace function expense_by_category(p_start date, p_end date)
+returns table (
+    category text,
+    total numeric
+)
+language sql
+stable
+as $$
+    select t.category::text, sum(t.amount)
+    from transactions t
+    where t.type = 'EXPENSE'
+      and t.date >= p_start
+      and t.date <= p_end
+    group by t.category;
+$$;
@@ -0,0 +1,13 @@
+-- Every list/report loader filters on a date range and pages in
+-- (date, id) order, so index that pair on each dated table.
+-- attendance (worker_id, date) lookups are already covered by
+-- attendance_worker_id_date_key.
+
+create index if not exists transactions_date_id_idx
+    on transactions (date, id);
+
+create index if not exists attendance_date_id_idx
+    on attendance (date, id);
+
+create index if not exists worker_payments_date_id_idx
+    on worker_payments (date, id);